@@ -0,0 +1,117 @@
+import sqlite3
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from update_rpm import update_rpm
+
+# Tiny test package from the createrepo_c test suite
+FIXTURE = Path(__file__).parent / "data" / "fake_bash-1.1.1-1.x86_64.rpm"
+
+
+def main_header_blob(data: bytes) -> bytes:
+    """
+    The main header of an RPM file in the form it is stored in the RPM database,
+    i.e. without the magic and reserved bytes
+    """
+    offset = update_rpm.RPM_LEAD_SIZE
+    nindex, hsize = struct.unpack_from(">ii", data, offset + 8)
+    offset += 16 + 16 * nindex + hsize
+    offset += -offset % 8
+    nindex, hsize = struct.unpack_from(">ii", data, offset + 8)
+    return data[offset + 8 : offset + 16 + 16 * nindex + hsize]
+
+
+class ParseRpmNameVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.data = FIXTURE.read_bytes()
+
+    def test_real_rpm(self):
+        self.assertEqual(
+            update_rpm.parse_rpm_name_version(self.data), ("fake_bash", "1.1.1")
+        )
+
+    def test_from_file(self):
+        self.assertEqual(
+            update_rpm.infer_package_name_version_from_file(FIXTURE),
+            ("fake_bash", "1.1.1"),
+        )
+
+    def test_truncated(self):
+        for size in range(len(self.data)):
+            with self.subTest(size=size):
+                self.assertIn(
+                    update_rpm.parse_rpm_name_version(self.data[:size]),
+                    [(None, None), ("fake_bash", "1.1.1")],
+                )
+        self.assertEqual(
+            update_rpm.parse_rpm_name_version(
+                self.data[: update_rpm.RPM_LEAD_SIZE + 16]
+            ),
+            (None, None),
+        )
+
+    def test_not_an_rpm(self):
+        self.assertEqual(
+            update_rpm.parse_rpm_name_version(b"<html><body>Not found</body></html>"),
+            (None, None),
+        )
+        corrupt = self.data[: update_rpm.RPM_LEAD_SIZE] + b"\0" * 64
+        self.assertEqual(update_rpm.parse_rpm_name_version(corrupt), (None, None))
+
+
+class HeaderStringTest(unittest.TestCase):
+    def setUp(self):
+        self.blob = main_header_blob(FIXTURE.read_bytes())
+
+    def test_tags(self):
+        self.assertEqual(
+            update_rpm.header_string(self.blob, update_rpm.RPMTAG_NAME), "fake_bash"
+        )
+        self.assertEqual(
+            update_rpm.header_string(self.blob, update_rpm.RPMTAG_VERSION), "1.1.1"
+        )
+
+    def test_missing_tag(self):
+        self.assertIsNone(update_rpm.header_string(self.blob, 999999))
+
+
+class InstalledVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self.tmpdir.name) / "rpmdb.sqlite"
+        con = sqlite3.connect(db_path)
+        con.execute(
+            "CREATE TABLE Packages (hnum INTEGER PRIMARY KEY, blob BLOB NOT NULL)"
+        )
+        con.execute("CREATE TABLE Name (key TEXT NOT NULL, hnum INTEGER, idx INTEGER)")
+        con.execute(
+            "INSERT INTO Packages VALUES (1, ?)",
+            (main_header_blob(FIXTURE.read_bytes()),),
+        )
+        con.execute("INSERT INTO Name VALUES ('fake_bash', 1, 0)")
+        con.commit()
+        con.close()
+
+        self.rpmdb_path = update_rpm.RPMDB_PATH
+        update_rpm.RPMDB_PATH = str(db_path)
+        update_rpm.rpmdb_connection.cache_clear()
+        update_rpm.installed_version.cache_clear()
+
+    def tearDown(self):
+        update_rpm.rpmdb_connection().close()
+        update_rpm.RPMDB_PATH = self.rpmdb_path
+        update_rpm.rpmdb_connection.cache_clear()
+        update_rpm.installed_version.cache_clear()
+        self.tmpdir.cleanup()
+
+    def test_installed(self):
+        self.assertEqual(update_rpm.installed_version("fake_bash"), "1.1.1")
+
+    def test_not_installed(self):
+        self.assertIsNone(update_rpm.installed_version("real_bash"))
+
+
+if __name__ == "__main__":
+    unittest.main()
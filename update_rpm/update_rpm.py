@@ -4,22 +4,126 @@ Script to install or update an RPM package from a link
 """
 
 import argparse
+import functools
+import hashlib
+import html
+import json
+import os
 import pprint
 import re
 import shlex
+import shutil
+import sqlite3
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
+from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
+import urllib3
 from jsonpath_ng.ext import parse
 from packaging.version import Version
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from version_utils import rpm
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 endpoints = ["url", "json", "github", "html"]
 
+# One shared session so that consecutive requests to the same host
+# (e.g. HEAD redirect resolve followed by the download) reuse the connection
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    # Once retries are used up, return the last response so that callers
+    # can inspect it (e.g. a rate limited 429) or raise_for_status()
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,
+    ),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+SESSION.headers["User-Agent"] = "update-rpm"
+# Advertise only the codings urllib3 can decode with the installed packages
+# (br and zstd need the `fast` extra), best compression first
+SESSION.headers["Accept-Encoding"] = ", ".join(
+    coding
+    for coding in ("zstd", "br", "gzip")
+    if coding in urllib3.util.request.ACCEPT_ENCODING.split(",")
+)
+
+# Plain urllib3 pools for the HEADs that resolve download redirects,
+# which need none of the requests Session machinery
+HEAD_POOL_RETRIES = Retry(total=8, connect=3, read=3, redirect=5, backoff_factor=0.3)
+HEAD_POOL_TIMEOUT = urllib3.Timeout(connect=5, read=60)
+
+
+def head_pool(url) -> urllib3.PoolManager:
+    """
+    Pool for a HEAD to `url`, honouring the same proxy and CA bundle
+    environment variables as `SESSION`
+    """
+    proxies = requests.utils.get_environ_proxies(url)
+    return _head_pool(requests.utils.select_proxy(url, proxies))
+
+
+@functools.lru_cache(maxsize=None)
+def _head_pool(proxy: str | None) -> urllib3.PoolManager:
+    ca_bundle = (
+        os.environ.get("REQUESTS_CA_BUNDLE")
+        or os.environ.get("CURL_CA_BUNDLE")
+        or requests.utils.DEFAULT_CA_BUNDLE_PATH
+    )
+    kwargs = dict(
+        num_pools=2,
+        maxsize=4,
+        retries=HEAD_POOL_RETRIES,
+        timeout=HEAD_POOL_TIMEOUT,
+        **{"ca_cert_dir" if os.path.isdir(ca_bundle) else "ca_certs": ca_bundle},
+    )
+    if proxy is None:
+        return urllib3.PoolManager(**kwargs)
+    if proxy.lower().startswith("socks"):
+        from urllib3.contrib.socks import SOCKSProxyManager
+
+        return SOCKSProxyManager(proxy, **kwargs)
+    return urllib3.ProxyManager(proxy, **kwargs)
+
+
+# Files larger than this are fetched as concurrent Range requests when the server allows it
+PARALLEL_DOWNLOAD_MIN_SIZE = 32 * 1024 * 1024
+
+# An empty XDG_CACHE_HOME counts as unset
+CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "update-rpm"
+)
+
+# Matches the target of every href attribute in an HTML page, quoted or not
+HREF_PATTERN = re.compile(
+    rb"""href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE
+)
+
+RPMDB_PATH = "/var/lib/rpm/rpmdb.sqlite"
+RPM_LEAD_MAGIC = b"\xed\xab\xee\xdb"
+RPM_LEAD_SIZE = 96
+RPM_HEADER_MAGIC = b"\x8e\xad\xe8\x01"
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+
 presets = {
     "plex": {
         "endpoint": "json",
@@ -80,6 +184,8 @@ presets = {
     },
 }
 
+_PRESET_HELP = "\n" + pprint.pformat(presets)
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -127,15 +233,18 @@ def parse_args():
     html_parser.add_argument(
         "-r",
         "--regex_selector",
-        help=r"Regex Selector. The first link that searches the given regex will be chosen. Example: '^docker-ce.*x86_64\.rpm$'",
+        help=r"Regex Selector. The first link whose file name searches the given regex will be chosen. Example: '^docker-ce.*x86_64\.rpm$'",
         type=str,
         default=r"\.rpm$",
     )
 
-    preset_parser = subparsers.add_parser("preset", help="Choose from a given preset")
+    preset_parser = subparsers.add_parser(
+        "preset", help="Choose from one or more of the given presets"
+    )
     preset_parser.add_argument(
         "preset",
-        help="\n" + str(pprint.pformat(presets)),
+        help=_PRESET_HELP,
+        nargs="+",
         choices=presets.keys(),
         type=str,
     )
@@ -172,9 +281,7 @@ def get_github_release(repo, file_selector):
         sys.exit(1)
 
     json_url = f"https://api.github.com/repos/{owner}/{repo_name}/releases/latest"
-    resp = requests.get(json_url)
-    resp.raise_for_status()
-    js = resp.json()
+    js = get_cached_json(json_url, CACHE_DIR / f"{owner}_{repo_name}.json")
     try:
         release = next(
             x for x in js["assets"] if file_selector.lower() in x["name"].lower()
@@ -183,13 +290,107 @@ def get_github_release(repo, file_selector):
         names = "\n".join([x["name"] for x in js["assets"]])
         print(f"{file_selector=} not found. Available options:\n{names}")
         sys.exit(1)
-    return release["browser_download_url"], release["name"]
+    return release["browser_download_url"], release["name"], js["assets"]
+
+
+def github_asset_sha256(assets, name) -> str | None:
+    """
+    The SHA-256 of a release asset, as reported by GitHub or published in a `.sha256` sibling asset
+    """
+    release = next(x for x in assets if x["name"] == name)
+    digest = release.get("digest") or ""
+    if digest.startswith("sha256:"):
+        return digest.removeprefix("sha256:")
+
+    sibling_name = release["name"] + ".sha256"
+    sibling = next((x for x in assets if x["name"] == sibling_name), None)
+    if sibling is None:
+        return None
+    resp = SESSION.get(sibling["browser_download_url"])
+    resp.raise_for_status()
+    fields = resp.text.split()
+    if not fields:
+        print(f"{sibling_name} is empty; not verifying the checksum.")
+        return None
+    return fields[0]
+
+
+def loads_json(data: bytes):
+    """
+    Decode JSON with orjson if it is installed (`update-rpm[fast]`)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+_api_client_lock = threading.Lock()
+
+
+def api_client():
+    """
+    Client for the JSON API endpoints, created on first use.
+    With the `http2` extra, concurrent requests to the same host (e.g. api.github.com
+    for several presets) share one multiplexed HTTP/2 connection; otherwise this is
+    the requests session. Both are called with the same `get(url, headers=...)`.
+    Note that httpx only retries failed connections, not 429/5xx responses.
+    """
+    with _api_client_lock:
+        return _api_client()
+
+
+@functools.lru_cache(maxsize=None)
+def _api_client():
+    try:
+        import h2  # noqa: F401  (needed by httpx for HTTP/2)
+        import httpx
+    except ImportError:
+        return SESSION
+    return httpx.Client(
+        transport=httpx.HTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+        ),
+        headers={"User-Agent": SESSION.headers["User-Agent"]},
+        follow_redirects=True,
+    )
+
+
+def get_cached_json(json_url, cache_path):
+    """
+    GET a JSON document, revalidating a copy cached on disk with its ETag.
+    The cached copy is also used if the API rate limit has been exhausted.
+    """
+    etag_path = cache_path.with_suffix(".etag")
+    headers = {}
+    if cache_path.exists() and etag_path.exists():
+        headers["If-None-Match"] = etag_path.read_text()
+
+    resp = api_client().get(json_url, headers=headers)
+    if resp.status_code == 304:
+        return loads_json(cache_path.read_bytes())
+    if (
+        resp.status_code in (403, 429)
+        and resp.headers.get("X-RateLimit-Remaining") == "0"
+        and cache_path.exists()
+    ):
+        print(f"Rate limit exceeded for {json_url}; using cached response.")
+        return loads_json(cache_path.read_bytes())
+    resp.raise_for_status()
+
+    js = loads_json(resp.content)
+    if "ETag" in resp.headers:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_bytes(resp.content)
+        etag_path.write_text(resp.headers["ETag"])
+    return js
 
 
 def get_json_release(json_url, json_selector):
-    resp = requests.get(json_url)
+    resp = api_client().get(json_url)
     resp.raise_for_status()
-    js = resp.json()
+    js = loads_json(resp.content)
 
     jsonpath_expr = parse(json_selector)
 
@@ -205,30 +406,186 @@ def get_json_release(json_url, json_selector):
     return url, fname
 
 
+@functools.lru_cache(maxsize=32)
+def compile_selector(regex_selector: str) -> re.Pattern:
+    return re.compile(regex_selector, re.ASCII)
+
+
 def get_html_release(url, regex_selector):
-    resp = requests.get(url)
+    resp = SESSION.get(url)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.content, "html.parser")
 
-    pattern = re.compile(regex_selector)
+    pattern = compile_selector(regex_selector)
 
-    for link in soup.find_all("a", href=True):
-        href = link["href"]
-        if pattern.search(href):
+    for match in HREF_PATTERN.finditer(resp.content):
+        value = next(group for group in match.groups() if group is not None)
+        href = html.unescape(value.decode(errors="replace"))
+        fname = href.rsplit("/", 1)[-1]
+        if pattern.search(fname):
             url = url.rsplit("/", 1)[0] + "/" + href
-            fname = href.split("/")[-1]
             return url, fname
 
     print(f"Could not locate a link containing {regex_selector=} in HTML page.")
     sys.exit(1)
 
 
+def resolve_redirects(url):
+    """
+    HEAD `url`, following redirects. Returns the final URL.
+    """
+    resp = head_pool(url).request(
+        "HEAD",
+        url,
+        headers={"User-Agent": SESSION.headers["User-Agent"]},
+        preload_content=False,
+    )
+    resp.release_conn()
+    # Without redirects urllib3 only reports the request path
+    return urljoin(url, resp.geturl())
+
+
+def modified_since_download(url, path) -> bool:
+    """
+    Ask the server whether `url` has changed since it was downloaded to `path`
+    """
+    mtime = path.stat().st_mtime
+    resp = head_pool(url).request(
+        "HEAD",
+        url,
+        headers={
+            "User-Agent": SESSION.headers["User-Agent"],
+            "If-Modified-Since": formatdate(mtime, usegmt=True),
+        },
+        preload_content=False,
+    )
+    resp.release_conn()
+    if resp.status == 304:
+        return False
+    # Servers that ignore If-Modified-Since may still report when the file last changed
+    last_modified = resp.headers.get("Last-Modified")
+    if resp.status == 200 and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified).timestamp() > mtime
+        except (TypeError, ValueError):
+            pass
+    return True
+
+
+def sha256_of(path) -> str:
+    with open(path, "rb") as fil:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(fil, "sha256").hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: fil.read(1 << 20), b""):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
 def download_file(url, path):
     print(f"Downloading {url} to {path}")
-    resp = requests.get(url)
-    resp.raise_for_status()
+    # Download next to the target and only move it into place once complete,
+    # so that an interrupted download is never taken for an already downloaded file
+    part_path = path.with_name(path.name + ".part")
+    try:
+        last_modified = download_file_parallel(url, part_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    os.replace(part_path, path)
+    if last_modified:
+        # Lets later runs ask the server whether the file changed since it was downloaded
+        try:
+            mtime = parsedate_to_datetime(last_modified).timestamp()
+        except (TypeError, ValueError):
+            return
+        os.utime(path, (mtime, mtime))
+
+
+def download_file_streamed(url, path):
+    """
+    Download the file with a single streamed GET. Returns the Last-Modified header, if any.
+    """
+    with SESSION.get(url, stream=True, timeout=(5, 60)) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        with open(path, "wb") as fil:
+            try:
+                shutil.copyfileobj(resp.raw, fil, length=1 << 20)
+            except urllib3.exceptions.HTTPError as exc:
+                # Reading resp.raw bypasses the translation to requests exceptions
+                raise requests.ConnectionError(exc, response=resp) from exc
+    return resp.headers.get("Last-Modified")
+
+
+def download_file_parallel(url, path, n=8, chunk=8 * 1024 * 1024):
+    """
+    Download the file as `n` concurrent Range requests of `chunk` bytes each.
+    Falls back to a single streamed GET if the server does not support ranges
+    or the file is small. Returns the Last-Modified header, if any.
+    """
+    resp = SESSION.head(url, allow_redirects=True, timeout=(5, 60))
+    size = int(resp.headers.get("Content-Length", 0))
+    if (
+        not resp.ok
+        or resp.headers.get("Accept-Ranges") != "bytes"
+        or "Content-Encoding" in resp.headers
+        or size < PARALLEL_DOWNLOAD_MIN_SIZE
+    ):
+        return download_file_streamed(url, path)
+
+    url = resp.url
     with open(path, "wb") as fil:
-        fil.write(resp.content)
+        fd = fil.fileno()
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            futures = [
+                pool.submit(
+                    _download_range, url, fd, start, min(start + chunk, size) - 1
+                )
+                for start in range(0, size, chunk)
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # Don't download the remaining ranges of a file that will be discarded
+                pool.shutdown(cancel_futures=True)
+                raise
+    return resp.headers.get("Last-Modified")
+
+
+def _download_range(url, fd, start, end, attempts=3):
+    """
+    Download bytes `start` to `end` (inclusive) of `url` and write them at the same offset in `fd`.
+    Connection and status failures are retried by the session's adapter; a body that is
+    cut off while being read is resumed from where it stopped, with exponential backoff.
+    """
+    offset = start
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(0.3 * 2 ** (attempt - 1))
+        headers = {"Range": f"bytes={offset}-{end}", "Accept-Encoding": "identity"}
+        with SESSION.get(url, headers=headers, stream=True, timeout=(5, 60)) as resp:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise requests.HTTPError(
+                    f"Expected partial content for {headers['Range']}, got {resp.status_code}",
+                    response=resp,
+                )
+            try:
+                for data in resp.iter_content(chunk_size=1 << 20):
+                    os.pwrite(fd, data, offset)
+                    offset += len(data)
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                pass
+        if offset == end + 1:
+            return
+    raise requests.ConnectionError(
+        f"Incomplete range bytes={start}-{end}: got {offset - start} bytes"
+    )
 
 
 def infer_package_name_version_from_url(
@@ -248,110 +605,263 @@ def infer_package_name_version_from_first_kb(
     url: str,
 ) -> tuple[str, str] | tuple[None, None]:
     """
-    Infer package name and package version by downloading the first kB from an URL and inspecting the header of the RPM file with the `rpm` command
+    Infer package name and package version by downloading the first kB from an URL and parsing the headers of the RPM file
     """
-    temp_path = Path(tempfile.gettempdir()) / Path(Path(url).name).with_suffix(".tmp")
-    with open(temp_path, "wb") as temp_file:
-        temp_file.write(requests.get(url, headers={"Range": "bytes=0-1024"}).content)
+    with SESSION.get(url, headers={"Range": "bytes=0-8191"}, stream=True) as resp:
+        return parse_rpm_name_version(resp.raw.read(8192, decode_content=True))
 
-    try:
-        result = subprocess.run(
-            f'rpm -qp --queryformat "%{{NAME}} %{{VERSION}}" {temp_path}',
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-        ).stdout.strip()
 
-        if result:
-            name, version = result.split()
-            return name, version
+def infer_package_name_version_from_file(
+    path: Path,
+) -> tuple[str, str] | tuple[None, None]:
+    """
+    Infer package name and package version from the headers of a downloaded RPM file
+    """
+    with open(path, "rb") as fil:
+        return parse_rpm_name_version(fil.read(8192))
 
-    except subprocess.CalledProcessError:
-        pass
 
-    finally:
-        temp_path.unlink(missing_ok=True)
+def parse_rpm_name_version(data: bytes) -> tuple[str, str] | tuple[None, None]:
+    """
+    Read the package name and version from the start of an RPM file
+    """
+    if data[:4] != RPM_LEAD_MAGIC:
+        return None, None
+    try:
+        # The lead is followed by the signature header, padded to 8 bytes, and then the main header
+        offset = RPM_LEAD_SIZE
+        for _ in range(2):
+            if data[offset : offset + 4] != RPM_HEADER_MAGIC:
+                return None, None
+            header = data[offset + 8 :]
+            nindex, hsize = struct.unpack_from(">ii", header, 0)
+            offset += 16 + 16 * nindex + hsize
+            offset += -offset % 8
+        name = header_string(header, RPMTAG_NAME)
+        version = header_string(header, RPMTAG_VERSION)
+    except (struct.error, ValueError):
+        return None, None
 
+    if name and version:
+        return name, version
     return None, None
 
 
-def main():
-    args = parse_args()
-    endpoint = args.endpoint
-    redownload = args.redownload
-    reinstall = args.reinstall
-    directory = Path(args.directory)
+parse_version = functools.lru_cache(maxsize=128)(Version)
+
+
+@functools.lru_cache(maxsize=None)
+def rpmdb_connection() -> sqlite3.Connection:
+    """
+    Read-only connection to the RPM database, opened once per process
+    """
+    return sqlite3.connect(
+        f"file:{RPMDB_PATH}?mode=ro", uri=True, check_same_thread=False
+    )
 
-    if endpoint == "preset":
-        preset = presets[args.preset]
-        endpoint = preset["endpoint"]
-        args = argparse.Namespace(**preset)
 
+def header_string(blob: bytes, tag: int) -> str | None:
+    """
+    Look up a string tag in an RPM header blob (index count, data length, index entries, data store)
+    """
+    nindex, _ = struct.unpack_from(">ii", blob, 0)
+    store = 8 + 16 * nindex
+    for i in range(nindex):
+        entry_tag, _, offset, _ = struct.unpack_from(">iiii", blob, 8 + 16 * i)
+        if entry_tag == tag:
+            start = store + offset
+            return blob[start : blob.index(b"\0", start)].decode()
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def installed_version(name: str) -> str | None:
+    """
+    Version of the installed package `name`, or None if it is not installed
+    or installed in multiple versions.
+    Reads the RPM database directly, falling back to `rpm -q` if it is not readable.
+    Cached, as nothing is installed until all packages have been fetched.
+    """
+    try:
+        rows = (
+            rpmdb_connection()
+            .execute(
+                "SELECT Packages.blob FROM Name JOIN Packages ON Name.hnum = Packages.hnum WHERE Name.key = ?",
+                (name,),
+            )
+            .fetchall()
+        )
+        versions = [header_string(blob, RPMTAG_VERSION) for (blob,) in rows]
+    except (sqlite3.Error, struct.error, ValueError):
+        try:
+            result = subprocess.run(
+                ["rpm", "-q", "--queryformat", "%{VERSION}\\n", name],
+                capture_output=True,
+                text=True,
+            )
+        except FileNotFoundError:
+            return None
+        if result.returncode != 0:
+            return None
+        versions = result.stdout.splitlines()
+
+    if len(versions) == 1:
+        return versions[0]
+    return None
+
+
+def query_installed_version_by_guessed_name(
+    url: str,
+) -> tuple[str, str | None] | tuple[None, None]:
+    """
+    Guess the package name from the file name in the (possibly redirecting) URL
+    and look up its installed version
+    """
+    name, _ = infer_package_name_version_from_url(url)
+    if not name:
+        return None, None
+    return name, installed_version(name)
+
+
+def fetch_package(endpoint, args, directory, redownload, reinstall) -> Path | None:
+    """
+    Locate the latest RPM for the given endpoint and download it unless the same
+    or a newer version is already installed.
+    Returns the path of the RPM to install, or None if there is nothing to install.
+    """
+    guessed_name = guessed_installed = None
+    not_modified = False
+    assets = None
     if endpoint == "github":
-        url, fname = get_github_release(args.repo, args.file_selector)
+        url, fname, assets = get_github_release(args.repo, args.file_selector)
     elif endpoint == "json":
         url, fname = get_json_release(args.json_url, args.json_selector)
     elif endpoint == "url":
-        resp = requests.head(args.url, allow_redirects=True)
-        url = resp.url
+        # Look up the installed version while the redirect is being resolved
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            head = pool.submit(resolve_redirects, args.url)
+            guess = pool.submit(query_installed_version_by_guessed_name, args.url)
+            url = head.result()
+            guessed_name, guessed_installed = guess.result()
         fname = url.split("/")[-1]
     elif endpoint == "html":
         url, fname = get_html_release(args.url, args.regex_selector)
     else:
-        print(f"Unknown endpoint type. Choose from {endpoints + ["preset"]}")
+        print(f"Unknown endpoint type. Choose from {endpoints + ['preset']}")
         sys.exit(1)
 
+    path = directory / fname
+    # The same URL may serve a newer RPM under the same file name, so ask the
+    # server whether a previously downloaded file is still current
+    stale = False
+    if endpoint == "url" and path.exists() and not redownload:
+        stale = modified_since_download(url, path)
+        not_modified = not stale
+
     package_name, rpm_version = infer_package_name_version_from_url(url)
+    if not package_name and not_modified:
+        package_name, rpm_version = infer_package_name_version_from_file(path)
     if not package_name:
         package_name, rpm_version = infer_package_name_version_from_first_kb(url)
 
     if package_name and rpm_version is not None:
-        installed_versions = subprocess.run(
-            f"rpm -q {package_name} --queryformat '%{{VERSION}}'",
-            shell=True,
-            capture_output=True,
-            text=True,
-        ).stdout.splitlines()
-        if len(installed_versions) == 1:
-            installed_version = installed_versions[0]
-            if not installed_version.endswith("not installed"):
-                print(f"{package_name} {installed_version} already installed")
-                if Version(installed_version) < Version(rpm_version):
+        if package_name == guessed_name:
+            installed = guessed_installed
+        else:
+            installed = installed_version(package_name)
+        if installed is not None:
+            print(f"{package_name} {installed} already installed")
+            installed_v = parse_version(installed)
+            rpm_v = parse_version(rpm_version)
+            if installed_v < rpm_v:
+                install = True
+            elif installed_v == rpm_v:
+                if reinstall:
                     install = True
-                elif Version(installed_version) == Version(rpm_version):
-                    if reinstall:
-                        install = True
-                    else:
-                        print(
-                            f"Version {installed_version} already installed; not installing."
-                        )
-                        install = False
                 else:
-                    print(
-                        f"Installed version {installed_version} newer than downloaded version {rpm_version}; not installing."
-                    )
+                    print(f"Version {installed} already installed; not installing.")
                     install = False
             else:
-                install = True
+                print(
+                    f"Installed version {installed} newer than downloaded version {rpm_version}; not installing."
+                )
+                install = False
         else:
             install = True
     else:
         install = True
 
-    if install:
-        path = directory / fname
-        if path.exists() and not redownload:
-            print(f"{fname} already exists. Skipping download.")
-        else:
-            download_file(url, path)
+    if not install:
+        return None
+
+    if stale:
+        print(f"{fname} has changed on the server since it was downloaded.")
+    if path.exists() and not redownload and not stale:
+        print(f"{fname} already exists. Skipping download.")
+    else:
+        download_file(url, path)
+
+    sha256 = github_asset_sha256(assets, fname) if assets is not None else None
+    if sha256 is not None:
+        actual = sha256_of(path)
+        if actual.lower() != sha256.lower():
+            print(f"SHA-256 mismatch for {path}: expected {sha256}, got {actual}")
+            path.unlink(missing_ok=True)
+            sys.exit(1)
+    return path
+
+
+def main():
+    args = parse_args()
+    redownload = args.redownload
+    reinstall = args.reinstall
+    directory = Path(args.directory)
 
-        cmd = ["sudo", "-S", "dnf", "install", "--assumeyes", str(path)]
+    if args.endpoint == "preset":
+        # Duplicates would download into the same file at the same time
+        targets = {
+            name: argparse.Namespace(**presets[name])
+            for name in dict.fromkeys(args.preset)
+        }
+    else:
+        targets = {args.endpoint: args}
+
+    # Presets are independent, so discover and download them concurrently
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = {
+            name: pool.submit(
+                fetch_package, target.endpoint, target, directory, redownload, reinstall
+            )
+            for name, target in targets.items()
+        }
+
+    # A failing preset should not keep the others from being installed
+    paths = []
+    failed = []
+    for name, future in futures.items():
+        try:
+            path = future.result()
+        except (Exception, SystemExit) as exc:
+            # On SystemExit fetch_package has already printed the reason
+            if not isinstance(exc, SystemExit):
+                print(f"{name}: {exc}")
+            failed.append(name)
+            continue
+        if path is not None:
+            paths.append(str(path))
+
+    if paths:
+        cmd = ["sudo", "-S", "dnf", "install", "--assumeyes", *dict.fromkeys(paths)]
         cmd_s = shlex.join(cmd)
         print("Installing ...")
         print(cmd_s)
         subprocess.call(cmd)
 
+    if failed:
+        if len(targets) > 1:
+            print(f"Failed to update: {', '.join(failed)}")
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()